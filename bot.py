@@ -5,6 +5,12 @@ from pyrogram import Client, idle
 from aiohttp import web
 import config
 from server.stream_routes import routes 
+from server.debug_routes import debug_routes
+from utils.streamer import ByteStreamer
+from utils.shaper import BandwidthShaper
+from utils.access_log import AccessLogger
+from utils.prefetch import Prefetcher
+from utils.debug import LoopLagMonitor, StreamRegistry
 
 # লগিং সেটআপ
 logging.basicConfig(
@@ -32,6 +38,7 @@ class Bot(Client):
         me = await self.get_me()
         self.username = me.username
         self.upstream_log_chat = config.LOG_CHANNEL
+        self.streamer = ByteStreamer(self)
         
         logger.info(f"Bot Started as @{me.username}")
 
@@ -40,9 +47,34 @@ class Bot(Client):
         
         # অ্যাপের ভেতরে ক্লায়েন্ট পাস করা (যাতে stream_routes এটা পায়)
         app["bot_client"] = self 
+        app["streamer"] = self.streamer
+        app["shaper"] = BandwidthShaper()
+        
+        # স্ট্রিম রেকর্ড ব্যাকগ্রাউন্ডে ব্যাচে ডিস্কে লেখা হয়
+        if config.ACCESS_LOG_ENABLED:
+            self.access_log = AccessLogger()
+            self.access_log.start()
+            app["access_log"] = self.access_log
+        
+        # পরের chunk/এপিসোড আগে থেকে ক্যাশে আনা
+        if config.PREFETCH_ENABLED:
+            self.prefetcher = Prefetcher(self.streamer, getattr(self, "access_log", None))
+            self.prefetcher.start()
+            app["prefetcher"] = self.prefetcher
         
         app.add_routes(routes)
         
+        # ডিবাগ endpoint শুধু DEBUG_ENABLED এবং DEBUG_TOKEN থাকলেই চালু হয়
+        if config.DEBUG_ENABLED and config.DEBUG_TOKEN:
+            self.lag_monitor = LoopLagMonitor()
+            self.lag_monitor.start()
+            app["debug_streams"] = StreamRegistry()
+            app["debug_lag"] = self.lag_monitor
+            app.add_routes(debug_routes)
+            logger.info("Debug endpoints enabled at /debug/*")
+        elif config.DEBUG_ENABLED:
+            logger.warning("DEBUG_ENABLED is set but DEBUG_TOKEN is empty - debug endpoints disabled")
+        
         runner = web.AppRunner(app)
         await runner.setup()
         
@@ -57,6 +89,12 @@ class Bot(Client):
         await idle()
 
     async def stop(self, *args):
+        if getattr(self, "lag_monitor", None):
+            self.lag_monitor.stop()
+        if getattr(self, "prefetcher", None):
+            await self.prefetcher.stop()
+        if getattr(self, "access_log", None):
+            await self.access_log.stop()
         await super().stop()
         logger.info("Bot Stopped")
 
@@ -44,6 +44,90 @@ USE_HTTPS: bool = os.environ.get("USE_HTTPS", "True").lower() == "true"
 CHUNK_SIZE: int = 1024 * 1024  # 1 MB
 MAX_CONCURRENT_STREAMS: int = 50
 
+# More ranges than this in one request are served as a single covering range
+MAX_RANGES: int = 16
+
+# Recently fetched chunks are kept in RAM (shared by all viewers)
+CHUNK_CACHE_SIZE: int = int(os.environ.get("CHUNK_CACHE_SIZE", 64 * 1024 * 1024))  # 64 MB
+
+# =============================================================================
+# PREFETCH
+# =============================================================================
+# পরের chunk এবং পরের এপিসোড (message_id + 1) আগে থেকেই ক্যাশে আনা
+PREFETCH_ENABLED: bool = os.environ.get("PREFETCH_ENABLED", "True").lower() == "true"
+PREFETCH_RATE: int = int(os.environ.get("PREFETCH_RATE", 4 * 1024 * 1024))  # global budget, bytes/s
+PREFETCH_CONCURRENCY: int = 2  # speculative GetFile calls at once
+PREFETCH_MAX_LIVE: int = 8  # skip prefetch while this many live GetFile calls are running
+PREFETCH_SECONDS: float = 10.0  # how far ahead of the viewer to stay, in seconds
+PREFETCH_MAX_CHUNKS: int = 4  # ...but never more chunks than this
+PREFETCH_NEXT_FILE_AT: float = 0.8  # warm message_id + 1 after this fraction is watched
+PREFETCH_POPULAR_FILES: int = 5  # first chunk of the most watched files stays warm
+PREFETCH_POPULAR_INTERVAL: float = 300.0  # seconds
+
+# =============================================================================
+# STREAM LINK SIGNING
+# =============================================================================
+# Secret used to sign stream/download tokens (HMAC-SHA256).
+# খালি থাকলে BOT_TOKEN থেকে একটি key বানানো হবে, তাই রিস্টার্টের পরেও লিংক কাজ করবে
+STREAM_SECRET: str = os.environ.get("STREAM_SECRET", "")
+
+# How long a generated link stays valid (seconds). 0 = never expires
+STREAM_LINK_TTL: int = int(os.environ.get("STREAM_LINK_TTL", 30 * 24 * 60 * 60))  # 30 days
+
+# =============================================================================
+# BANDWIDTH SHAPING
+# =============================================================================
+# সব রেট bytes/second এ, 0 মানে কোনো লিমিট নেই
+SHAPING_ENABLED: bool = os.environ.get("SHAPING_ENABLED", "True").lower() == "true"
+
+# Cap per client IP (all connections combined) and per file (all viewers combined)
+SHAPING_MAX_RATE_PER_IP: int = int(os.environ.get("SHAPING_MAX_RATE_PER_IP", 8 * 1024 * 1024))
+SHAPING_MAX_RATE_PER_FILE: int = int(os.environ.get("SHAPING_MAX_RATE_PER_FILE", 0))
+
+# Downloads yield to playback. While at least one viewer is streaming, each
+# download connection is capped and all downloads share a pool of
+# POOL_RATE / active viewers (never below POOL_MIN_RATE). With no viewers
+# these two limits are lifted.
+SHAPING_DOWNLOAD_RATE: int = int(os.environ.get("SHAPING_DOWNLOAD_RATE", 2 * 1024 * 1024))
+SHAPING_DOWNLOAD_POOL_RATE: int = int(os.environ.get("SHAPING_DOWNLOAD_POOL_RATE", 16 * 1024 * 1024))
+SHAPING_DOWNLOAD_POOL_MIN_RATE: int = int(os.environ.get("SHAPING_DOWNLOAD_POOL_MIN_RATE", 2 * 1024 * 1024))
+
+# Number of proxies in front of the app that append to X-Forwarded-For
+# (Render = 1). The client IP is taken that many entries from the right;
+# 0 ignores the header entirely.
+TRUSTED_PROXY_HOPS: int = int(os.environ.get("TRUSTED_PROXY_HOPS", 1))
+
+# Playback is paced at bitrate * factor, after an unpaced initial burst
+SHAPING_PACE_FACTOR: float = float(os.environ.get("SHAPING_PACE_FACTOR", 3.0))
+SHAPING_MIN_PLAYBACK_RATE: int = int(os.environ.get("SHAPING_MIN_PLAYBACK_RATE", 1024 * 1024))
+SHAPING_INITIAL_BURST: int = int(os.environ.get("SHAPING_INITIAL_BURST", 8 * 1024 * 1024))
+
+# =============================================================================
+# ACCESS LOG
+# =============================================================================
+# প্রতিটি স্ট্রিমের রেকর্ড ব্যাচে JSONL ফাইলে লেখা হয় (দিনে একটি ফাইল)
+ACCESS_LOG_ENABLED: bool = os.environ.get("ACCESS_LOG_ENABLED", "True").lower() == "true"
+ACCESS_LOG_DIR: str = os.environ.get("ACCESS_LOG_DIR", "logs")
+# Records buffered before new ones are dropped, and seconds between flushes
+ACCESS_LOG_QUEUE_SIZE: int = int(os.environ.get("ACCESS_LOG_QUEUE_SIZE", 10000))
+ACCESS_LOG_FLUSH_INTERVAL: float = float(os.environ.get("ACCESS_LOG_FLUSH_INTERVAL", 5.0))
+ACCESS_LOG_RETENTION_DAYS: int = 7  # 0 = keep forever
+# রিপোর্টে একই ক্লায়েন্টের একই ফাইলের রেসপন্সগুলো এর চেয়ে কম বিরতিতে হলে একটাই দেখা (সেকেন্ড)
+ACCESS_LOG_SESSION_GAP: int = 1800
+# যে দেখা ফাইলের এই অংশ পর্যন্ত পৌঁছায়নি সেটা abandoned
+ACCESS_LOG_COMPLETE_AT: float = 0.9
+
+# =============================================================================
+# DEBUG
+# =============================================================================
+# /debug/* endpoints (live stream tasks, loop lag, cProfile). Off by default.
+# চালু করলে DEBUG_TOKEN অবশ্যই দিতে হবে
+DEBUG_ENABLED: bool = os.environ.get("DEBUG_ENABLED", "False").lower() == "true"
+DEBUG_TOKEN: str = os.environ.get("DEBUG_TOKEN", "")
+DEBUG_DUMP_DIR: str = os.environ.get("DEBUG_DUMP_DIR", "debug")
+DEBUG_LAG_INTERVAL: float = 0.1  # seconds between loop lag samples
+DEBUG_MAX_PROFILE_SECONDS: float = 60.0
+
 # =============================================================================
 # VALIDATION
 # =============================================================================
@@ -12,6 +12,7 @@ from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 from pyrogram.enums import ParseMode
 
 import config
+from utils.tokens import encode_stream_token
 
 logger = logging.getLogger(__name__)
 
@@ -103,21 +104,34 @@ def clean_base_url(url: str) -> str:
     return url
 
 
-def generate_stream_link(message_id: int) -> str:
-    """Generate the stream URL for a file."""
+def generate_token(message_id: int, file_info: dict) -> str:
+    """Mint a signed token carrying the file's metadata."""
+    return encode_stream_token(
+        message_id=message_id,
+        file_size=file_info["file_size"],
+        mime_type=file_info["mime_type"],
+        file_unique_id=file_info["file_unique_id"],
+        file_id=file_info["file_id"],
+        file_name=file_info.get("file_name"),
+        duration=file_info.get("duration"),
+    )
+
+
+def generate_stream_link(message_id: int, file_info: dict) -> str:
+    """Generate the signed stream URL for a file."""
     base_url = clean_base_url(config.get_base_url())
-    return f"{base_url}/watch/{message_id}"
+    return f"{base_url}/watch/{generate_token(message_id, file_info)}"
 
 
-def generate_download_link(message_id: int, file_name: str) -> str:
-    """Generate the download URL for a file."""
+def generate_download_link(message_id: int, file_info: dict) -> str:
+    """Generate the signed download URL for a file."""
     base_url = clean_base_url(config.get_base_url())
     
     # Fix: Use quote to handle spaces and special characters safely
     # আগের কোডে শুধু replace(" ", "_") ছিল যা যথেষ্ট নয়
-    safe_name = quote(file_name) 
+    safe_name = quote(file_info["file_name"]) 
     
-    return f"{base_url}/download/{message_id}/{safe_name}"
+    return f"{base_url}/download/{generate_token(message_id, file_info)}/{safe_name}"
 
 
 # =============================================================================
@@ -177,7 +191,7 @@ async def help_command(client: Client, message: Message):
 
 **Tips:**
 • For best video playback, use MP4/MKV format
-• Links are permanent unless you delete the source file
+• Links are signed and expire after some time - just send the file again for a fresh link
 """
     await message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
 
@@ -222,8 +236,15 @@ async def handle_file(client: Client, message: Message):
             return
 
         message_id = forwarded.id
-        stream_link = generate_stream_link(message_id)
-        download_link = generate_download_link(message_id, file_info["file_name"])
+        
+        # লগ চ্যানেলের মেসেজের file_id টোকেনে যায়, যাতে রিস্টার্টের পরেও lookup না লাগে
+        link_info = get_file_info(forwarded) or file_info
+        streamer = getattr(client, "streamer", None)
+        if streamer:
+            streamer.cache_properties(message_id, link_info)
+        
+        stream_link = generate_stream_link(message_id, link_info)
+        download_link = generate_download_link(message_id, link_info)
         
         response_text = f"""
 **✅ Your Stream Link is Ready!**
@@ -0,0 +1,90 @@
+"""
+Debug endpoints (only registered when config.DEBUG_ENABLED is set).
+
+Every request must carry config.DEBUG_TOKEN in the X-Debug-Token header.
+A query parameter is not accepted, because access logs record the query
+string.
+"""
+
+import asyncio
+import hmac
+import logging
+import math
+
+from aiohttp import web
+
+import config
+from utils.debug import dump_snapshot, profile_loop
+
+logger = logging.getLogger(__name__)
+
+debug_routes = web.RouteTableDef()
+
+_profile_lock = asyncio.Lock()
+
+
+def is_authorized(request: web.Request) -> bool:
+    """Check the debug token in constant time."""
+    token = request.headers.get("X-Debug-Token", "")
+    # bytes এ তুলনা: str হলে non-ASCII টোকেনে TypeError হয়
+    return bool(config.DEBUG_TOKEN) and hmac.compare_digest(
+        token.encode("utf-8", "surrogateescape"), config.DEBUG_TOKEN.encode()
+    )
+
+
+def collect(request: web.Request) -> dict:
+    app = request.app
+    tasks = asyncio.all_tasks()
+    return {
+        "streams": app["debug_streams"].snapshot(),
+        "loop_lag": app["debug_lag"].snapshot(),
+        "asyncio_tasks": len(tasks),
+        "streamer": app["streamer"].get_stats() if app.get("streamer") else None,
+    }
+
+
+@debug_routes.get("/debug/tasks")
+async def tasks_handler(request):
+    if not is_authorized(request):
+        return web.Response(status=403, text="Forbidden")
+    return web.json_response(collect(request))
+
+
+@debug_routes.get("/debug/loop")
+async def loop_handler(request):
+    if not is_authorized(request):
+        return web.Response(status=403, text="Forbidden")
+    return web.json_response(request.app["debug_lag"].snapshot())
+
+
+@debug_routes.post("/debug/dump")
+async def dump_handler(request):
+    if not is_authorized(request):
+        return web.Response(status=403, text="Forbidden")
+    path = dump_snapshot(collect(request))
+    return web.json_response({"path": path})
+
+
+@debug_routes.post("/debug/profile")
+async def profile_handler(request):
+    if not is_authorized(request):
+        return web.Response(status=403, text="Forbidden")
+
+    try:
+        seconds = float(request.query.get("seconds", 10))
+    except ValueError:
+        return web.Response(status=400, text="Invalid seconds")
+    # nan/inf হলে sleep কখনো শেষ হয় না আর প্রোফাইলার চিরকাল চালু থাকে
+    if not math.isfinite(seconds) or seconds <= 0:
+        return web.Response(status=400, text="Invalid seconds")
+    seconds = min(seconds, config.DEBUG_MAX_PROFILE_SECONDS)
+
+    # একসাথে দুটো প্রোফাইলার চালানো যায় না
+    if _profile_lock.locked():
+        return web.Response(status=409, text="A profile is already running")
+
+    async with _profile_lock:
+        logger.info(f"Profiling event loop for {seconds}s")
+        result = await profile_loop(seconds)
+
+    return web.Response(text=f"Saved to {result['path']}\n\n{result['top']}")
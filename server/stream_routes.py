@@ -1,65 +1,288 @@
 import time
+import uuid
+import asyncio
 import logging
+import mimetypes
+from typing import Optional
+from urllib.parse import quote
 from aiohttp import web
 from pyrogram.types import Message
 from pyrogram import Client
 
+import config
+from utils.shaper import DOWNLOAD, PLAYBACK
+from utils.streamer import StreamerError
+from utils.tokens import InvalidTokenError, decode_stream_token
+
+logger = logging.getLogger(__name__)
+
 routes = web.RouteTableDef()
 
 @routes.get("/", allow_head=True)
 async def root_route_handler(request):
     return web.json_response({"status": "running", "maintainer": "StreamFlix"})
 
-@routes.get("/watch/{message_id}", allow_head=True)
+@routes.get("/metrics")
+async def metrics_handler(request):
+    shaper = request.app.get("shaper")
+    access_log = request.app.get("access_log")
+    streamer = request.app.get("streamer")
+    prefetcher = request.app.get("prefetcher")
+    return web.json_response({
+        "shaping": shaper.get_stats() if shaper else None,
+        "access_log": access_log.get_stats() if access_log else None,
+        "streamer": streamer.get_stats() if streamer else None,
+        "prefetch": prefetcher.get_stats() if prefetcher else None,
+    })
+
+@routes.get("/watch/{token}", allow_head=True)
 async def stream_handler(request):
+    return await serve_file(request, disposition="inline", priority=PLAYBACK)
+
+@routes.get("/download/{token}/{file_name}", allow_head=True)
+async def download_handler(request):
+    return await serve_file(request, disposition="attachment", priority=DOWNLOAD)
+
+
+class MultipartRanges:
+    """Builds a multipart/byteranges body around the streamer's range data."""
+
+    def __init__(self, ranges, mime_type: str, file_size: int):
+        self.ranges = ranges
+        self.boundary = uuid.uuid4().hex
+        self._headers = [
+            (
+                f"\r\n--{self.boundary}\r\n"
+                f"Content-Type: {mime_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        self._closing = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_length(self) -> int:
+        return (
+            sum(len(h) for h in self._headers)
+            + sum(end - start + 1 for start, end in self.ranges)
+            + len(self._closing)
+        )
+
+    async def body(self, parts):
+        """Interleave part headers with (index, bytes) tuples from yield_ranges."""
+        current = None
+        try:
+            async for index, data in parts:
+                if index != current:
+                    current = index
+                    yield self._headers[index] + data
+                else:
+                    yield data
+            yield self._closing
+        finally:
+            await parts.aclose()
+
+
+def content_disposition(disposition: str, file_name: str) -> str:
+    """Content-Disposition value that stays valid for any file name (RFC 6266)."""
+    # কোটেশন, স্ল্যাশ, কন্ট্রোল ক্যারেক্টার বাদ; বাংলা নাম filename* এ UTF-8 হয়ে যায়
+    name = "".join(c for c in file_name if c.isprintable() and c not in '"\\/').strip()
+    name = name or "file"
+    fallback = "".join(c if c.isascii() else "_" for c in name)
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+def get_client_ip(request: web.Request) -> str:
+    """Real client IP (Render puts the app behind a proxy)."""
+    # বাঁদিকের এন্ট্রি ক্লায়েন্ট নিজেই বসাতে পারে, তাই trusted proxy যেটা যোগ করেছে সেটা নেওয়া
+    hops = config.TRUSTED_PROXY_HOPS
+    forwarded = request.headers.get("X-Forwarded-For")
+    if hops > 0 and forwarded:
+        entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+        if len(entries) >= hops:
+            return entries[-hops]
+    return request.remote or "unknown"
+
+
+async def serve_file(request: web.Request, disposition: str, priority: str):
+    """Verify the signed token and stream the file (supports Range requests)."""
+    # ডিবাগ চালু না থাকলে registry নেই, hot path এ কোনো খরচ নেই
+    debug_streams = request.app.get("debug_streams")
+    if not debug_streams:
+        return await _serve_file(request, disposition, priority, None)
+
+    # প্রথম GetFile বা FloodWait এ আটকে থাকা স্ট্রিমও যেন দেখা যায়, তাই শুরুতেই register
+    debug_info = debug_streams.register(client=get_client_ip(request), priority=priority)
+    try:
+        return await _serve_file(request, disposition, priority, debug_info)
+    finally:
+        debug_streams.unregister(debug_info)
+
+
+async def _serve_file(
+    request: web.Request,
+    disposition: str,
+    priority: str,
+    debug_info: Optional[dict],
+):
+    started = time.monotonic()
+
+    # টোকেন যাচাই শুধু CPU দিয়ে হয়, Telegram কল লাগে না
     try:
-        # মেসেজ আইডি ইন্টিজার হতে হবে
-        message_id = int(request.match_info['message_id'])
+        token = decode_stream_token(request.match_info["token"])
+    except InvalidTokenError as e:
+        return web.Response(status=403, text=f"Error: {e}")
+
+    streamer = request.app.get("streamer")
+    if not streamer:
+        return web.Response(status=500, text="Error: Streamer Not Initialized in App")
+
+    message_id = token["message_id"]
+    file_size = token["file_size"]
+
+    # খালি ফাইল: স্ট্রিম করার কিছু নেই
+    if file_size == 0:
+        return web.Response(status=200, headers={
+            "Content-Type": token["mime_type"],
+            "Content-Length": "0",
+        })
+
+    range_header = request.headers.get("Range")
+    try:
+        ranges = streamer.parse_ranges(range_header, file_size)
     except ValueError:
-        return web.Response(status=400, text="Invalid Message ID (Must be a number)")
-
-    # বট ক্লায়েন্ট এবং চ্যানেল আইডি চেক করা
-    client = request.app.get("bot_client")
-    if not client:
-        return web.Response(status=500, text="Error: Bot Client Not Initialized in App")
-    
-    log_channel = client.upstream_log_chat
-    if not log_channel:
-        return web.Response(status=500, text="Error: LOG_CHANNEL ID is missing in Config")
-
-    # সরাসরি এরর দেখার জন্য আমরা এখানে Try-Catch ব্যবহার করছি
+        return web.Response(status=416, headers={"Content-Range": f"bytes */{file_size}"})
+    if ranges is None:
+        # হেডার নেই বা অবৈধ (যেমন bytes=abc, bytes=5-2): উপেক্ষা করে পুরো ফাইল 200 তে
+        range_header = None
+        ranges = [(0, file_size - 1)]
+    start, end = ranges[0][0], ranges[-1][1]
+    length = end - start + 1
+
+    if debug_info is not None:
+        debug_info.update(message_id=message_id, offset=start)
+
+    # একাধিক range হলে multipart/byteranges রেসপন্স
+    multipart = None
+    if len(ranges) > 1:
+        multipart = MultipartRanges(ranges, token["mime_type"], file_size)
+        length = multipart.content_length
+
+    # টোকেনের file_id দিয়েই সরাসরি স্ট্রিম, lookup লাগে না; ক্যাশে নতুন (রিফ্রেশ করা) file_id থাকলে সেটা
+    properties = streamer.get_cached_properties(message_id)
+    if properties and properties["file_unique_id"] != token["file_unique_id"]:
+        return web.Response(status=410, text="Error: File has been replaced or removed.")
+
+    file_id = properties["file_id"] if properties else token["file_id"]
+    duration = token["duration"]
+
+    # নাম টোকেন থেকে (সাইন করা); URL এর file_name অংশ শুধু দেখানোর জন্য
+    file_name = token["file_name"] or f"file{mimetypes.guess_extension(token['mime_type']) or ''}"
+    headers = {
+        "Content-Type": token["mime_type"],
+        "Content-Length": str(length),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(disposition, file_name),
+    }
+    status = 200
+    if multipart:
+        status = 206
+        headers["Content-Type"] = f"multipart/byteranges; boundary={multipart.boundary}"
+    elif range_header:
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+
+    if request.method == "HEAD":
+        return web.Response(status=status, headers=headers)
+
     try:
-        msg = await client.get_messages(chat_id=log_channel, message_ids=message_id)
-        
-        # যদি মেসেজ এম্পটি হয় (মানে ডিলেট হয়ে গেছে বা নেই)
-        if not msg or msg.empty:
-            return web.Response(status=404, text=f"Error: Message ID {message_id} not found in Channel {log_channel}. (File deleted?)")
-            
-        # ভিডিও বা ফাইল আছে কিনা চেক
-        media = msg.video or msg.document
-        if not media:
-             return web.Response(status=404, text=f"Error: Message ID {message_id} exists but has NO VIDEO file.")
-
-        # সব ঠিক থাকলে ভিডিও স্ট্রিম করা
-        file_id = media.file_id
-        file_size = media.file_size
-        file_name = media.file_name or "video.mp4"
-        
-        # ExoPlayer এর জন্য MP4 হেডার
-        headers = {
-            'Content-Type': 'video/mp4',
-            'Content-Length': str(file_size),
-            'Accept-Ranges': 'bytes',
-            'Content-Disposition': f'inline; filename="{file_name}"'
-        }
-        
-        return web.Response(
-            status=200,
-            headers=headers,
-            body=client.stream_media(file_id)
-        )
+        # পুরনো file reference হলে streamer নিজেই রিফ্রেশ করে একই অফসেট থেকে চালিয়ে যায়
+        if multipart:
+            body = multipart.body(
+                streamer.yield_ranges(file_id, ranges, message_id=message_id, status=debug_info)
+            )
+        else:
+            body = streamer.yield_file(
+                file_id, start, length, message_id=message_id, status=debug_info
+            )
+        if debug_info is not None:
+            debug_info["body"] = body
+        first_chunk = await body.__anext__()
 
+    except StopAsyncIteration:
+        return web.Response(status=500, text="Error: Telegram returned no data for this file.")
     except Exception as e:
-        # 🔥 এই লাইনটিই আপনাকে আসল সমস্যা বলে দেবে
+        logger.exception(f"Error preparing stream for message {message_id}")
         error_text = f"CRITICAL ERROR:\n{str(e)}\n\nCheck:\n1. Is Bot Admin?\n2. Is Channel ID Correct?\n3. Did you restart the bot?"
         return web.Response(status=500, text=error_text)
+
+    bitrate = file_size / duration if duration else None
+
+    client_ip = get_client_ip(request)
+    shaper = request.app["shaper"]
+    session = shaper.session(client_ip, message_id, priority, bitrate)
+
+    prefetcher = request.app.get("prefetcher")
+    tracker = None
+    if prefetcher and not multipart:
+        tracker = prefetcher.track(client_ip, message_id, file_id, file_size, start)
+
+    response = web.StreamResponse(status=status, headers=headers)
+    sent = 0
+    ttfb = None
+    cancelled = False
+    error = False
+
+    try:
+        await response.prepare(request)
+        await response.write(first_chunk)
+        ttfb = time.monotonic() - started
+        sent += len(first_chunk)
+        if tracker:
+            tracker.advance(start + sent)
+        if debug_info is not None:
+            debug_info.update(state="streaming", offset=start + sent, bytes=sent)
+        await session.throttle(len(first_chunk))
+        async for chunk in body:
+            await response.write(chunk)
+            sent += len(chunk)
+            if tracker:
+                tracker.advance(start + sent)
+            if debug_info is not None:
+                debug_info.update(offset=start + sent, bytes=sent)
+            await session.throttle(len(chunk))
+    except (ConnectionResetError, ConnectionError, asyncio.CancelledError) as e:
+        # ইউজার প্লেয়ার বন্ধ করেছে বা seek করেছে
+        logger.debug(f"Client disconnected from message {message_id}")
+        cancelled = True
+        if isinstance(e, asyncio.CancelledError):
+            raise
+    except StreamerError as e:
+        logger.error(f"Stream aborted for message {message_id}: {e}")
+        error = True
+    finally:
+        session.close()
+        if tracker:
+            tracker.close()
+        await body.aclose()
+
+        access_log = request.app.get("access_log")
+        if access_log:
+            access_log.record({
+                "ts": int(time.time()),
+                "message_id": message_id,
+                "file_size": file_size,
+                "priority": priority,
+                "client": client_ip,
+                "user_agent": request.headers.get("User-Agent", ""),
+                "range_start": start,
+                "range_end": end,
+                "bytes": sent,
+                "duration": round(time.monotonic() - started, 3),
+                "ttfb": round(ttfb, 3) if ttfb is not None else None,
+                # cancelled = শুধু ক্লায়েন্ট নিজে কানেকশন বন্ধ করলে; সার্ভারের সমস্যা আলাদা
+                "cancelled": cancelled,
+                "error": error or (not cancelled and sent < length),
+            })
+
+    return response
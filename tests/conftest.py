@@ -0,0 +1,5 @@
+import os
+import sys
+
+# টেস্ট যেকোনো ফোল্ডার থেকে চালালেও config, utils import হবে
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+import config
+from utils.access_log import build_report, group_sessions
+
+MB = config.CHUNK_SIZE
+SIZE = 100 * MB
+
+
+def record(ts, start, sent, client="1.1.1.1", message_id=1, cancelled=True, **extra):
+    return dict({
+        "ts": ts, "duration": 1, "client": client, "message_id": message_id,
+        "file_size": SIZE, "range_start": start, "range_end": SIZE - 1,
+        "bytes": sent, "cancelled": cancelled, "error": False,
+    }, **extra)
+
+
+def test_responses_of_one_viewing_are_one_session():
+    # প্লেয়ার প্রতিটা seek এ কানেকশন কেটে নতুন Range চায়
+    records = [
+        record(10, 0, 10 * MB),
+        record(20, 10 * MB, 10 * MB),       # ধারাবাহিক, seek নয়
+        record(30, 60 * MB, 5 * MB),        # seek
+        record(40, 65 * MB, 35 * MB, cancelled=False),
+    ]
+    sessions = group_sessions(records)
+
+    assert len(sessions) == 1
+    assert sessions[0]["responses"] == 4
+    assert sessions[0]["seeks"] == 1
+    assert sessions[0]["furthest"] == SIZE
+
+    report = build_report(records)
+    assert report["sessions"] == 1
+    assert report["responses"] == 4
+    assert report["abandon_rate"] == 0.0
+    assert report["seek_rate"] == 1.0
+
+
+def test_sessions_split_by_client_and_idle_gap():
+    gap = config.ACCESS_LOG_SESSION_GAP
+    records = [
+        record(10, 0, MB),
+        record(12, 0, MB, client="2.2.2.2"),
+        record(10 + gap + 100, 0, MB),
+    ]
+    assert len(group_sessions(records)) == 3
+
+
+def test_abandoned_only_when_short_of_the_end():
+    records = [
+        record(10, 0, 20 * MB, client="a"),
+        record(10, 0, SIZE, client="b", cancelled=False),
+        record(10, 0, 20 * MB, client="c", file_size=None),  # আকার অজানা: গোনা হয় না
+    ]
+    report = build_report(records)
+    assert report["abandon_rate"] == 0.5
+    assert report["seek_rate"] == 0.0
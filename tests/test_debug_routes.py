@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import config
+from server.debug_routes import debug_routes
+
+
+def request(method, path, headers=None):
+    async def run():
+        app = web.Application()
+        app.add_routes(debug_routes)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.request(method, path, headers=headers)
+            return response.status
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def debug_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "secret")
+    monkeypatch.setattr(config, "DEBUG_DUMP_DIR", str(tmp_path))
+
+
+def test_token_only_in_header():
+    assert request("POST", "/debug/profile?token=secret&seconds=1") == 403
+    assert request("POST", "/debug/profile?seconds=x", {"X-Debug-Token": "wrong"}) == 403
+    assert request("POST", "/debug/profile?seconds=x", {"X-Debug-Token": "সিক্রেট"}) == 403
+
+
+@pytest.mark.parametrize("seconds", ["nan", "inf", "-inf", "0", "-1", "abc"])
+def test_profile_rejects_bad_seconds(seconds):
+    status = request("POST", f"/debug/profile?seconds={seconds}", {"X-Debug-Token": "secret"})
+    assert status == 400
+
+
+def test_profile_runs_for_a_short_window():
+    assert request("POST", "/debug/profile?seconds=0.01", {"X-Debug-Token": "secret"}) == 200
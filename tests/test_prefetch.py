@@ -0,0 +1,40 @@
+import asyncio
+
+import config
+from utils.prefetch import Prefetcher
+
+
+class SlowStreamer:
+    live_requests = 0
+
+    def __init__(self):
+        self.cancelled = 0
+
+    def get_cached_properties(self, message_id):
+        return None
+
+    def has_chunk(self, file_id, offset):
+        return False
+
+    async def prefetch(self, message_id, offset, file_id=None):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def test_stop_cancels_warms_in_flight():
+    async def run():
+        streamer = SlowStreamer()
+        prefetcher = Prefetcher(streamer)
+        prefetcher.schedule(1, "file", 0)
+        prefetcher.schedule(1, "file", config.CHUNK_SIZE)
+        await asyncio.sleep(0)
+
+        assert prefetcher.get_stats()["pending"] == 2
+        await prefetcher.stop()
+        assert prefetcher.get_stats()["pending"] == 0
+        assert streamer.cancelled == 2
+
+    asyncio.run(run())
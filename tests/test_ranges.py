@@ -0,0 +1,62 @@
+import pytest
+
+import config
+from utils.ranges import parse_ranges
+
+SIZE = 1000
+
+
+def test_no_header_serves_whole_file():
+    assert parse_ranges(None, SIZE) is None
+    assert parse_ranges("", SIZE) is None
+
+
+def test_single_ranges():
+    assert parse_ranges("bytes=0-99", SIZE) == [(0, 99)]
+    assert parse_ranges("bytes=500-", SIZE) == [(500, 999)]
+    assert parse_ranges("bytes=900-5000", SIZE) == [(900, 999)]
+
+
+def test_suffix_ranges():
+    assert parse_ranges("bytes=-100", SIZE) == [(900, 999)]
+    assert parse_ranges("bytes=-5000", SIZE) == [(0, 999)]
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    assert parse_ranges("bytes=0-99, 50-199", SIZE) == [(0, 199)]
+    assert parse_ranges("bytes=100-199,0-99", SIZE) == [(0, 199)]
+    assert parse_ranges("bytes=0-9,20-29,-10", SIZE) == [(0, 9), (20, 29), (990, 999)]
+
+
+def test_unsatisfiable_ranges_are_dropped():
+    assert parse_ranges("bytes=0-9,5000-6000", SIZE) == [(0, 9)]
+
+
+def test_too_many_ranges_collapse_to_one():
+    specs = ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(config.MAX_RANGES + 1))
+    assert parse_ranges(f"bytes={specs}", SIZE) == [(0, config.MAX_RANGES * 10 + 1)]
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=1000-2000",
+    "bytes=-0",
+    "bytes=1000-,2000-3000",
+])
+def test_unsatisfiable_raises(header):
+    with pytest.raises(ValueError):
+        parse_ranges(header, SIZE)
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=abc",
+    "bytes=5-2",
+    "bytes=-",
+    "bytes=0-9,x-y",
+    "bytes= +5-10",
+    "bytes=",
+    "items=0-9",
+    "0-9",
+])
+def test_invalid_header_is_ignored(header):
+    assert parse_ranges(header, SIZE) is None
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from pyrogram.errors import FileReferenceExpired
+from pyrogram.file_id import FileId, FileType
+
+import config
+from utils.streamer import ByteStreamer, FileReferenceError
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.bytes = data
+
+
+class FakeSession:
+    """Media session that serves a fake file and counts GetFile calls."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offsets = []
+
+    async def invoke(self, query, **kwargs):
+        self.offsets.append(query.offset)
+        return FakeResult(self.data[query.offset:query.offset + query.limit])
+
+
+class FakeClient:
+    def __init__(self, sessions):
+        self.media_sessions = sessions
+        self.media_sessions_lock = asyncio.Lock()
+
+    async def invoke(self, query, **kwargs):
+        raise AssertionError("GetFile must go through the file's DC session")
+
+
+def make_file_id(dc_id: int = 4, media_id: int = 1) -> str:
+    return FileId(
+        file_type=FileType.DOCUMENT,
+        dc_id=dc_id,
+        media_id=media_id,
+        access_hash=2,
+        file_reference=b"ref",
+    ).encode()
+
+
+def collect(agen):
+    async def run():
+        return [item async for item in agen]
+    return asyncio.run(run())
+
+
+def test_get_file_goes_to_the_files_dc():
+    data = bytes(range(256)) * 10
+    home, other = FakeSession(b""), FakeSession(data)
+    streamer = ByteStreamer(FakeClient({2: home, 4: other}))
+
+    chunks = collect(streamer.yield_file(make_file_id(dc_id=4), 0, len(data)))
+
+    assert b"".join(chunks) == data
+    assert other.offsets and not home.offsets
+
+
+class ExpiringSession(FakeSession):
+    """Fails the first GetFile with FILE_REFERENCE_EXPIRED."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.expired = False
+
+    async def invoke(self, query, **kwargs):
+        if not self.expired:
+            self.expired = True
+            raise FileReferenceExpired()
+        return await super().invoke(query, **kwargs)
+
+
+def make_refreshing_streamer(data: bytes, new_media_id: int):
+    streamer = ByteStreamer(FakeClient({4: ExpiringSession(data)}))
+
+    async def refresh_file_id(message_id, stale_file_id):
+        return make_file_id(media_id=new_media_id)
+
+    streamer.refresh_file_id = refresh_file_id
+    return streamer
+
+
+def test_resumes_after_refresh_of_the_same_file():
+    data = b"x" * 100
+    streamer = make_refreshing_streamer(data, new_media_id=1)
+
+    chunks = collect(streamer.yield_file(make_file_id(media_id=1), 0, len(data), message_id=9))
+
+    assert b"".join(chunks) == data
+
+
+def test_refresh_to_a_different_file_aborts():
+    streamer = make_refreshing_streamer(b"x" * 100, new_media_id=2)
+
+    with pytest.raises(FileReferenceError):
+        collect(streamer.yield_file(make_file_id(media_id=1), 0, 100, message_id=9))
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_SIZE", 16)
+
+
+DATA = bytes(range(100))
+
+
+def test_yield_ranges_fetches_each_chunk_once(small_chunks):
+    session = FakeSession(DATA)
+    streamer = ByteStreamer(FakeClient({4: session}))
+    # দুটো range একই চাংক (16-31) ভাগ করে, শেষেরটা অন্য চাংকে
+    ranges = [(2, 5), (18, 20), (25, 40), (85, 95)]
+
+    parts = collect(streamer.yield_ranges(make_file_id(), ranges))
+
+    for index, (start, end) in enumerate(ranges):
+        assert b"".join(d for i, d in parts if i == index) == DATA[start:end + 1]
+    assert session.offsets == [0, 16, 32, 80]
+
+
+def test_cached_chunks_are_served_without_upstream_calls(small_chunks):
+    session = FakeSession(DATA)
+    streamer = ByteStreamer(FakeClient({4: session}))
+    file_id = make_file_id()
+
+    collect(streamer.yield_file(file_id, 0, len(DATA)))
+    fetched = list(session.offsets)
+    assert streamer.has_chunk(file_id, 50)
+
+    parts = collect(streamer.yield_ranges(file_id, [(10, 20), (70, 99)]))
+    chunks = collect(streamer.yield_file(file_id, 30, 40))
+
+    assert b"".join(d for _, d in parts) == DATA[10:21] + DATA[70:]
+    assert b"".join(chunks) == DATA[30:70]
+    assert session.offsets == fetched
+    assert streamer.get_stats()["chunk_hits"] > 0
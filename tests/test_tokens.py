@@ -0,0 +1,81 @@
+import base64
+import time
+
+import pytest
+
+from utils import tokens
+from utils.tokens import InvalidTokenError, decode_stream_token, encode_stream_token
+
+
+def test_round_trip():
+    token = encode_stream_token(
+        42, 123456, "video/mp4", "AgADuniq", "BQACAgUAAx0",
+        file_name="Episode 01.mkv", duration=1500, ttl=3600,
+    )
+    data = decode_stream_token(token)
+
+    assert data["message_id"] == 42
+    assert data["file_size"] == 123456
+    assert data["mime_type"] == "video/mp4"
+    assert data["file_unique_id"] == "AgADuniq"
+    assert data["file_id"] == "BQACAgUAAx0"
+    assert data["file_name"] == "Episode 01.mkv"
+    assert data["duration"] == 1500
+    assert data["expires"] > time.time()
+
+
+def test_token_is_url_safe():
+    token = encode_stream_token(1, 10, "video/mp4", "u" * 40, "f" * 200, file_name="a b/c?.mp4")
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+def test_defaults():
+    data = decode_stream_token(encode_stream_token(7, 0, "", "", "f", ttl=0))
+    assert data["expires"] == 0
+    assert data["duration"] is None
+    assert data["file_name"] == ""
+    assert data["mime_type"] == "application/octet-stream"
+
+
+def test_long_unicode_file_name_is_cut_on_a_character_boundary():
+    name = "মুভি" * 100
+    data = decode_stream_token(encode_stream_token(1, 10, "video/mp4", "u", "f", file_name=name))
+    assert name.startswith(data["file_name"])
+    assert len(data["file_name"].encode()) <= 255
+
+
+@pytest.mark.parametrize("file_id", ["", "f" * 256])
+def test_file_id_must_fit(file_id):
+    with pytest.raises(ValueError):
+        encode_stream_token(1, 10, "video/mp4", "u", file_id)
+
+
+def test_expired_token_is_rejected():
+    token = encode_stream_token(1, 10, "video/mp4", "u", "f", ttl=1)
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    payload = bytes(raw[:-tokens._SIGNATURE_SIZE])
+    # expires অতীতে বসিয়ে আবার সাইন করা
+    header = list(tokens._HEADER.unpack_from(payload))
+    header[3] = int(time.time()) - 10
+    payload = tokens._HEADER.pack(*header) + payload[tokens._HEADER.size:]
+    expired = base64.urlsafe_b64encode(payload + tokens._sign(payload)).rstrip(b"=").decode()
+
+    with pytest.raises(InvalidTokenError):
+        decode_stream_token(expired)
+
+
+def test_tampered_token_is_rejected():
+    token = encode_stream_token(1, 10, "video/mp4", "u", "f")
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    raw[2] ^= 1
+    forged = base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode()
+
+    with pytest.raises(InvalidTokenError):
+        decode_stream_token(forged)
+
+
+@pytest.mark.parametrize("token", ["", "abc", "!!!!", "A" * 200])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(InvalidTokenError):
+        decode_stream_token(token)
+
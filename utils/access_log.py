@@ -0,0 +1,291 @@
+"""
+Asynchronous, batched access log for stream sessions.
+
+The stream handler only appends a dict to a bounded in-memory buffer;
+a background task flushes the buffer to daily-rotated JSONL files.
+When the buffer is full new records are dropped and counted instead of
+slowing down the hot path.
+
+Run this module directly for a quick report:
+    python -m utils.access_log [log_dir]
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+import aiofiles
+
+import config
+from utils.prefetch import is_seek
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLogger:
+    """
+    Collects per-stream records and writes them to disk in batches.
+
+    Also keeps running per-file counters in memory, so other components
+    (e.g. the prefetcher) can ask which files are popular right now.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = config.ACCESS_LOG_DIR,
+        max_queue: int = config.ACCESS_LOG_QUEUE_SIZE,
+        flush_interval: float = config.ACCESS_LOG_FLUSH_INTERVAL,
+    ):
+        """
+        Initialize the AccessLogger.
+
+        Args:
+            log_dir: Directory for the JSONL files
+            max_queue: Maximum number of buffered records
+            flush_interval: Seconds between flushes
+        """
+        self.log_dir = log_dir
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self._queue: Deque[dict] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+        self.dropped = 0
+        self.written = 0
+        self.popularity: Counter = Counter()  # message_id -> sessions
+
+    def record(self, entry: dict):
+        """
+        Queue a record without blocking. Drops it if the buffer is full.
+
+        Args:
+            entry: The stream session record
+        """
+        self.popularity[entry["message_id"]] += 1
+
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(entry)
+
+    def top_files(self, count: int = 10) -> List[int]:
+        """Return the most requested message IDs since startup."""
+        return [message_id for message_id, _ in self.popularity.most_common(count)]
+
+    def start(self):
+        """Start the background flush task."""
+        if self._task is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Access log flush failed: {e}")
+
+    def _current_path(self) -> str:
+        return os.path.join(self.log_dir, f"access-{time.strftime('%Y-%m-%d')}.jsonl")
+
+    async def flush(self):
+        """Write all buffered records to today's file."""
+        if not self._queue:
+            return
+
+        entries = []
+        while self._queue:
+            entries.append(self._queue.popleft())
+        batch = [json.dumps(entry, separators=(",", ":")) for entry in entries]
+
+        path = self._current_path()
+        new_file = not os.path.exists(path)
+
+        try:
+            async with aiofiles.open(path, "a") as f:
+                await f.write("\n".join(batch) + "\n")
+        except Exception:
+            # লেখা ব্যর্থ হলে ব্যাচ আবার সামনে রাখা; জায়গা না থাকলে dropped হিসেবে গোনা
+            room = max(0, self.max_queue - len(self._queue))
+            requeue = entries[-room:] if room else []
+            self._queue.extendleft(reversed(requeue))
+            self.dropped += len(entries) - len(requeue)
+            raise
+        self.written += len(batch)
+
+        if new_file:
+            self._prune()
+
+    def _prune(self):
+        """Delete log files beyond the retention window."""
+        keep = config.ACCESS_LOG_RETENTION_DAYS
+        if keep <= 0:
+            return
+        files = sorted(f for f in os.listdir(self.log_dir) if f.startswith("access-"))
+        for name in files[:-keep]:
+            os.remove(os.path.join(self.log_dir, name))
+
+    def get_stats(self) -> dict:
+        """Return pipeline counters."""
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def load_records(log_dir: str = config.ACCESS_LOG_DIR) -> List[dict]:
+    """Read every record from the JSONL files in log_dir."""
+    records = []
+    for name in sorted(os.listdir(log_dir)):
+        if not name.startswith("access-"):
+            continue
+        with open(os.path.join(log_dir, name)) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+def group_sessions(records: List[dict]) -> List[dict]:
+    """
+    Group responses into viewing sessions.
+
+    Players open a new response for every seek or Range request, so one
+    viewing is all responses for the same (client, message_id) that are
+    less than config.ACCESS_LOG_SESSION_GAP seconds apart.
+
+    Args:
+        records: Records as written by AccessLogger
+
+    Returns:
+        One dict per viewing with message_id, responses, bytes, seeks,
+        errors, furthest (highest byte reached) and file_size
+    """
+    sessions = []
+    open_sessions: Dict[tuple, dict] = {}
+    # ts লেখা হয় রেসপন্স শেষে, তাই শুরুর সময় অনুযায়ী সাজানো
+    for r in sorted(records, key=lambda r: r["ts"] - r.get("duration", 0)):
+        key = (r.get("client"), r["message_id"])
+        start = r.get("range_start") or 0
+        end = start + r["bytes"]
+        if r.get("range_end") is not None:
+            end = min(end, r["range_end"] + 1)  # multipart এ bytes এর মধ্যে হেডারও থাকে
+        begun = r["ts"] - r.get("duration", 0)
+
+        session = open_sessions.get(key)
+        if session is None or begun - session["last_ts"] > config.ACCESS_LOG_SESSION_GAP:
+            session = {
+                "message_id": r["message_id"], "responses": 0, "bytes": 0,
+                "seeks": 0, "errors": 0, "furthest": 0, "file_size": None,
+                "last_end": None, "last_ts": 0,
+            }
+            open_sessions[key] = session
+            sessions.append(session)
+
+        # prefetcher এর মতো একই নিয়ম: আগের রেসপন্স যেখানে থেমেছিল তার থেকে এক চাংকের বেশি লাফ
+        if is_seek(session["last_end"], start):
+            session["seeks"] += 1
+        session["responses"] += 1
+        session["bytes"] += r["bytes"]
+        session["errors"] += 1 if r.get("error") else 0
+        session["furthest"] = max(session["furthest"], end)
+        session["file_size"] = r.get("file_size") or session["file_size"]
+        session["last_end"] = end
+        session["last_ts"] = max(session["last_ts"], r["ts"])
+
+    for session in sessions:
+        del session["last_end"], session["last_ts"]
+    return sessions
+
+
+def is_abandoned(session: dict) -> Optional[bool]:
+    """Whether a viewing stopped well short of the end (None if the size is unknown)."""
+    if not session["file_size"]:
+        return None
+    return session["furthest"] < session["file_size"] * config.ACCESS_LOG_COMPLETE_AT
+
+
+def _rate(count: int, total: int) -> Optional[float]:
+    return round(count / total, 3) if total else None
+
+
+def build_report(records: List[dict], top: int = 10) -> dict:
+    """
+    Aggregate stream records.
+
+    Seek and abandonment rates are per viewing session (see group_sessions),
+    the error rate is per response.
+
+    Args:
+        records: Records as written by AccessLogger
+        top: How many files to list
+
+    Returns:
+        Dictionary with top files, seek behaviour, abandonment and error rates
+    """
+    sessions = group_sessions(records)
+
+    per_file: Dict[int, dict] = {}
+    for s in sessions:
+        stats = per_file.setdefault(s["message_id"], {
+            "sessions": 0, "responses": 0, "bytes": 0, "seeks": 0,
+            "errors": 0, "abandoned": 0, "known_size": 0,
+        })
+        stats["sessions"] += 1
+        for field in ("responses", "bytes", "seeks", "errors"):
+            stats[field] += s[field]
+        abandoned = is_abandoned(s)
+        if abandoned is not None:
+            stats["known_size"] += 1
+            stats["abandoned"] += abandoned
+
+    sized = [s for s in sessions if s["file_size"]]
+    ttfbs = sorted(r["ttfb"] for r in records if r.get("ttfb") is not None)
+
+    return {
+        "sessions": len(sessions),
+        "responses": len(records),
+        "bytes": sum(r["bytes"] for r in records),
+        "seek_rate": _rate(sum(1 for s in sessions if s["seeks"]), len(sessions)),
+        "abandon_rate": _rate(sum(1 for s in sized if is_abandoned(s)), len(sized)),
+        "error_rate": _rate(sum(1 for r in records if r.get("error")), len(records)),
+        "ttfb_p50": ttfbs[len(ttfbs) // 2] if ttfbs else None,
+        "top_files": [
+            dict(
+                {k: v for k, v in stats.items() if k != "known_size"},
+                message_id=message_id,
+                abandon_rate=_rate(stats["abandoned"], stats["known_size"]),
+            )
+            for message_id, stats in sorted(
+                per_file.items(), key=lambda item: item[1]["sessions"], reverse=True
+            )[:top]
+        ],
+    }
+
+
+if __name__ == "__main__":
+    log_dir = sys.argv[1] if len(sys.argv) > 1 else config.ACCESS_LOG_DIR
+    print(json.dumps(build_report(load_records(log_dir)), indent=2))
@@ -0,0 +1,209 @@
+"""
+Debug helpers for the streaming hot path.
+
+Only created when config.DEBUG_ENABLED is set; otherwise the stream
+handler never touches anything in this module.
+
+- StreamRegistry: live stream tasks with state, offset, speed and the
+  coroutine they are currently awaiting
+- LoopLagMonitor: event-loop lag histogram
+- profile_loop(): cProfile of the event loop thread over a time window
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from typing import Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the lag histogram buckets; the last one catches the rest
+LAG_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+
+def get_await_chain(obj) -> List[str]:
+    """
+    Follow a coroutine / async generator chain down to the innermost await.
+
+    Args:
+        obj: A coroutine, async generator or generator
+
+    Returns:
+        Function names from obj to where it is suspended
+    """
+    chain = []
+    while obj is not None:
+        code = (
+            getattr(obj, "cr_code", None)
+            or getattr(obj, "ag_code", None)
+            or getattr(obj, "gi_code", None)
+        )
+        if code is None:
+            chain.append(type(obj).__name__)
+            break
+        chain.append(code.co_name)
+        obj = (
+            getattr(obj, "cr_await", None)
+            or getattr(obj, "ag_await", None)
+            or getattr(obj, "gi_yieldfrom", None)
+        )
+    return chain
+
+
+def classify_await(chain: List[str]) -> Optional[str]:
+    """Turn an await chain into a coarse state for humans."""
+    if "_read_chunk" in chain and "sleep" in chain:
+        return "flood_wait"
+    if "fetch_chunk" in chain or "invoke" in chain:
+        return "telegram"
+    if "throttle" in chain:
+        return "throttled"
+    if "write" in chain or "drain" in chain or "prepare" in chain:
+        return "http_write"
+    return None
+
+
+class StreamRegistry:
+    """Keeps track of the stream responses currently being served."""
+
+    def __init__(self):
+        self._streams: Dict[int, dict] = {}
+        self._next_id = 0
+
+    def register(self, **info) -> dict:
+        """
+        Add the current task as a live stream.
+
+        Args:
+            **info: Static details (client, priority...)
+
+        Returns:
+            The mutable info dict. The handler fills in message_id, offset,
+            bytes and "body" (the response generator); the streamer writes
+            "await_point" into it while fetching chunks.
+        """
+        self._next_id += 1
+        info.update(
+            id=self._next_id,
+            task=asyncio.current_task(),
+            started=time.monotonic(),
+            state="starting",
+            bytes=0,
+        )
+        self._streams[self._next_id] = info
+        return info
+
+    def unregister(self, info: dict):
+        self._streams.pop(info["id"], None)
+
+    def snapshot(self) -> List[dict]:
+        """Return JSON-friendly details of every live stream."""
+        now = time.monotonic()
+        streams = []
+        for info in self._streams.values():
+            elapsed = max(now - info["started"], 0.001)
+            entry = {k: v for k, v in info.items() if k not in ("task", "started", "body")}
+            entry["elapsed"] = round(elapsed, 3)
+            entry["bytes_per_sec"] = int(info["bytes"] / elapsed)
+
+            task = info["task"]
+            chain = get_await_chain(task.get_coro()) if task and not task.done() else []
+
+            # async_generator_asend এর ভেতরে দেখা যায় না: body generator থেকে চেইন চালিয়ে
+            # যাওয়া, আর state এর জন্য streamer যে await_point লিখেছে সেটা নেওয়া
+            state = None
+            if chain and chain[-1] == "async_generator_asend":
+                body = info.get("body")
+                if body is not None:
+                    chain = chain[:-1] + get_await_chain(body)
+                state = info.get("await_point")
+            entry["await_chain"] = chain
+            entry["state"] = state or classify_await(chain) or info["state"]
+            streams.append(entry)
+        return streams
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a sleeping task."""
+
+    def __init__(self, interval: float = config.DEBUG_LAG_INTERVAL):
+        self.interval = interval
+        self.histogram = [0] * len(LAG_BUCKETS_MS)
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            for i, bound in enumerate(LAG_BUCKETS_MS):
+                if lag_ms <= bound:
+                    self.histogram[i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        labels = [f"<={b}ms" if b != float("inf") else f">{LAG_BUCKETS_MS[-2]}ms"
+                  for b in LAG_BUCKETS_MS]
+        return {
+            "interval": self.interval,
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+async def profile_loop(seconds: float) -> dict:
+    """
+    Run cProfile on the event loop thread for a time window.
+
+    Everything (pyrogram, aiohttp, the streamer) runs on this thread, so
+    the profile covers the whole hot path. The .prof file is written to
+    config.DEBUG_DUMP_DIR and can be opened with snakeviz or pstats.
+
+    Args:
+        seconds: Length of the window
+
+    Returns:
+        Dictionary with the dump path and the top functions by cumulative time
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    path = os.path.join(config.DEBUG_DUMP_DIR, f"profile-{int(time.time())}.prof")
+    os.makedirs(config.DEBUG_DUMP_DIR, exist_ok=True)
+    profiler.dump_stats(path)
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+    return {"path": path, "top": out.getvalue()}
+
+
+def dump_snapshot(data: dict) -> str:
+    """Write a JSON snapshot to config.DEBUG_DUMP_DIR and return its path."""
+    path = os.path.join(config.DEBUG_DUMP_DIR, f"snapshot-{int(time.time())}.json")
+    os.makedirs(config.DEBUG_DUMP_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    return path
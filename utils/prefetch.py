@@ -0,0 +1,255 @@
+"""
+Predictive prefetch into the ByteStreamer chunk cache.
+
+Viewers mostly watch sequentially, so while a stream is playing the
+next few chunks are fetched ahead of the player. How far ahead depends
+on how fast the client is reading and how often it seeks. Near the end
+of a file the first chunk of the next message in the log channel
+(usually the next episode) is warmed too, and the most popular files
+from the access log are kept warm in the background.
+
+All speculative work goes through a global byte budget and is skipped
+whenever live requests are busy, so it never competes with viewers.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import config
+from utils.shaper import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# How many (client, file) access patterns and missing message ids to remember
+_MAX_PATTERNS = 1000
+_MAX_MISSING = 1000
+
+
+def is_seek(last_end: Optional[int], start: int) -> bool:
+    """
+    Whether a response starting at start is a seek.
+
+    Args:
+        last_end: Where the previous response for the same client and file
+            stopped (None if there was none)
+        start: First byte of this response
+
+    Returns:
+        True if the player jumped by more than a chunk
+    """
+    return last_end is not None and abs(start - last_end) > config.CHUNK_SIZE
+
+
+class StreamTracker:
+    """Follows one response and schedules prefetch as it advances."""
+
+    def __init__(self, prefetcher: "Prefetcher", pattern: dict, message_id: int,
+                 file_id: str, file_size: int, start: int):
+        self.prefetcher = prefetcher
+        self.pattern = pattern
+        self.message_id = message_id
+        self.file_id = file_id
+        self.file_size = file_size
+        self.start = start
+        self.position = start
+        self._started = time.monotonic()
+        self._next_file_done = False
+
+    def lookahead(self) -> int:
+        """Number of chunks to keep ahead of the reader."""
+        # যারা বারবার seek করে তাদের জন্য বেশি আগে আনা অপচয়
+        if self.pattern["seeks"] * 2 > self.pattern["requests"]:
+            return 1
+
+        elapsed = max(time.monotonic() - self._started, 0.001)
+        speed = (self.position - self.start) / elapsed
+        chunks = math.ceil(speed * config.PREFETCH_SECONDS / config.CHUNK_SIZE)
+        return max(1, min(chunks, config.PREFETCH_MAX_CHUNKS))
+
+    def advance(self, position: int):
+        """
+        Report that the response has been written up to position.
+
+        Args:
+            position: Absolute byte offset reached in the file
+        """
+        self.position = position
+        chunk_size = config.CHUNK_SIZE
+        aligned = position - position % chunk_size
+
+        for i in range(1, self.lookahead() + 1):
+            offset = aligned + i * chunk_size
+            if offset >= self.file_size:
+                break
+            self.prefetcher.schedule(self.message_id, self.file_id, offset)
+
+        if (
+            not self._next_file_done
+            and self.file_size
+            and position >= self.file_size * config.PREFETCH_NEXT_FILE_AT
+        ):
+            self._next_file_done = True
+            self.prefetcher.schedule(self.message_id + 1, None, 0)
+
+    def close(self):
+        """Remember where this response stopped, to detect seeks next time."""
+        self.pattern["last_end"] = self.position
+
+
+class Prefetcher:
+    """
+    Decides what to warm and runs speculative fetches under a budget.
+    """
+
+    def __init__(self, streamer, access_log=None):
+        """
+        Initialize the Prefetcher.
+
+        Args:
+            streamer: The ByteStreamer whose chunk cache is warmed
+            access_log: Optional AccessLogger used for popularity
+        """
+        self.streamer = streamer
+        self.access_log = access_log
+        self._budget = TokenBucket(config.PREFETCH_RATE, config.PREFETCH_RATE)
+        self._patterns: "OrderedDict[Tuple[str, int], dict]" = OrderedDict()
+        # asyncio শুধু weak reference রাখে, তাই চলমান warm task গুলো এখানে ধরে রাখা
+        self._pending: Dict[Tuple[int, int], asyncio.Task] = {}
+        # message_id গুলো যেগুলোতে কোনো ফাইল নেই (আবার lookup না করার জন্য)
+        self._missing: "OrderedDict[int, None]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+        self.scheduled = 0
+        self.skipped = 0
+        self.warmed = 0
+
+    def track(self, client_ip: str, message_id: int, file_id: str,
+              file_size: int, start: int) -> StreamTracker:
+        """
+        Start following a response.
+
+        Args:
+            client_ip: The viewer's IP address
+            message_id: The file being served
+            file_id: The file's current file_id
+            file_size: Total file size
+            start: First byte of the response
+
+        Returns:
+            A StreamTracker; call advance() as bytes are written and close() at the end
+        """
+        key = (client_ip, message_id)
+        pattern = self._patterns.pop(key, None)
+        if pattern is None:
+            pattern = {"requests": 0, "seeks": 0, "last_end": None}
+        self._patterns[key] = pattern
+        if len(self._patterns) > _MAX_PATTERNS:
+            self._patterns.popitem(last=False)
+
+        # আগের রিকোয়েস্ট যেখানে থেমেছিল সেখান থেকে শুরু না হলে সেটা seek
+        pattern["requests"] += 1
+        if is_seek(pattern["last_end"], start):
+            pattern["seeks"] += 1
+
+        return StreamTracker(self, pattern, message_id, file_id, file_size, start)
+
+    def schedule(self, message_id: int, file_id: Optional[str], offset: int):
+        """
+        Warm a chunk in the background if the budget allows it.
+
+        Args:
+            message_id: The message ID in the log channel
+            file_id: The file_id if known (used to skip cached chunks)
+            offset: Chunk-aligned byte offset
+        """
+        key = (message_id, offset)
+        if key in self._pending:
+            return
+
+        if file_id is None:
+            cached = self.streamer.get_cached_properties(message_id)
+            if cached:
+                file_id = cached["file_id"]
+            elif message_id in self._missing:
+                return
+
+        if file_id and self.streamer.has_chunk(file_id, offset):
+            return
+
+        if (
+            len(self._pending) >= config.PREFETCH_CONCURRENCY
+            or self.streamer.live_requests >= config.PREFETCH_MAX_LIVE
+        ):
+            self.skipped += 1
+            return
+
+        self._pending[key] = asyncio.ensure_future(self._warm(key, file_id))
+
+    async def _warm(self, key: Tuple[int, int], file_id: Optional[str]):
+        message_id, offset = key
+        try:
+            if file_id is None:
+                # অনুমান (যেমন পরের এপিসোড) ভুল হলে মনে রাখা, বাজেট খরচ হয় না
+                try:
+                    properties = await self.streamer.get_file_properties(
+                        message_id, speculative=True
+                    )
+                except Exception:
+                    self._missing[message_id] = None
+                    if len(self._missing) > _MAX_MISSING:
+                        self._missing.popitem(last=False)
+                    return
+                file_id = properties["file_id"]
+                if self.streamer.has_chunk(file_id, offset):
+                    return
+
+            if not self._budget.try_take(config.CHUNK_SIZE):
+                self.skipped += 1
+                return
+
+            self.scheduled += 1
+            if await self.streamer.prefetch(message_id, offset, file_id):
+                self.warmed += 1
+        finally:
+            self._pending.pop(key, None)
+
+    def start(self):
+        """Start keeping popular files warm."""
+        if self._task is None and self.access_log:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop the background task and cancel warms still in flight."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(config.PREFETCH_POPULAR_INTERVAL)
+            for message_id in self.access_log.top_files(config.PREFETCH_POPULAR_FILES):
+                self.schedule(message_id, None, 0)
+
+    def get_stats(self) -> dict:
+        """Return prefetch counters."""
+        return {
+            "scheduled": self.scheduled,
+            "skipped": self.skipped,
+            "warmed": self.warmed,
+            "pending": len(self._pending),
+            "known_missing": len(self._missing),
+        }
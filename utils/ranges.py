@@ -0,0 +1,119 @@
+"""
+HTTP Range header parsing (RFC 9110, section 14).
+
+Kept free of Telegram imports so the web layer and the tests can use it
+without a client.
+
+A header that is missing, uses another unit or is syntactically invalid
+is ignored and the whole file is served (200). Only a valid header whose
+ranges all lie past the end of the file is "not satisfiable" (416).
+"""
+
+from typing import List, Optional, Tuple
+
+import config
+
+
+def _parse_int(value: str) -> int:
+    # int() " 5", "+5", "5_0" সবই মেনে নেয়; RFC শুধু DIGIT চায়
+    if not value.isdigit() or not value.isascii():
+        raise ValueError(f"Invalid range position: {value!r}")
+    return int(value)
+
+
+def parse_range_spec(spec: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse one "start-end", "start-" or "-suffix" spec.
+
+    Args:
+        spec: A single range spec (without the "bytes=" prefix)
+        file_size: Total file size
+
+    Returns:
+        Inclusive (start, end), or None if the range is valid but not satisfiable
+
+    Raises:
+        ValueError: If the spec is syntactically invalid
+    """
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        raise ValueError(f"Invalid range spec: {spec!r}")
+
+    if not first:
+        # Suffix range: last N bytes
+        suffix_length = _parse_int(last)
+        if suffix_length == 0:
+            return None
+        return max(0, file_size - suffix_length), file_size - 1
+
+    start = _parse_int(first)
+    if last:
+        end = _parse_int(last)
+        if end < start:
+            raise ValueError(f"Invalid range spec: {spec!r}")
+    else:
+        end = file_size - 1
+
+    if start >= file_size:
+        return None
+
+    return start, min(end, file_size - 1)
+
+
+def parse_ranges(range_header: Optional[str], file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse an HTTP Range header that may contain several ranges.
+
+    Overlapping or adjacent ranges are merged, and the result is sorted.
+    Requests with more than config.MAX_RANGES ranges are collapsed into
+    one covering range to bound the work per request.
+
+    Args:
+        range_header: The Range header value (may be None)
+        file_size: Total file size
+
+    Returns:
+        List of inclusive (start, end) byte positions, or None if the
+        header is absent or invalid and the whole file should be served
+
+    Raises:
+        ValueError: If the header is valid but no range is satisfiable
+    """
+    if not range_header:
+        return None
+
+    unit, sep, range_set = range_header.partition("=")
+    if not sep or unit.strip().lower() != "bytes":
+        return None
+
+    ranges = []
+    try:
+        for spec in range_set.split(","):
+            if not spec.strip():
+                continue
+            parsed = parse_range_spec(spec, file_size)
+            if parsed:
+                ranges.append(parsed)
+    except ValueError:
+        # ভুল সিনট্যাক্স হলে হেডার উপেক্ষা করে পুরো ফাইল
+        return None
+
+    if not ranges:
+        # কোনো spec ই ছিল না ("bytes=" বা "bytes=,") সেটাও অবৈধ হেডার
+        if not any(spec.strip() for spec in range_set.split(",")):
+            return None
+        raise ValueError("Range not satisfiable")
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+
+    if len(merged) > config.MAX_RANGES:
+        merged = [(merged[0][0], merged[-1][1])]
+
+    return merged
@@ -0,0 +1,245 @@
+"""
+Bandwidth shaping for the HTTP response writer.
+
+Every chunk written to a client is charged against a set of token
+buckets (per IP, per file, per priority class and per connection) and
+the writer sleeps for the longest resulting debt. Playback is paced
+relative to the file's bitrate with a fast initial burst.
+
+Downloads yield to playback: while anyone is watching, all downloads
+share a pool whose rate shrinks as more viewers join, and each download
+connection is capped. With no active viewers those download limits are
+lifted and only the per-IP/per-file caps apply.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PLAYBACK = "playback"
+DOWNLOAD = "download"
+
+
+class TokenBucket:
+    """
+    A token bucket that refills lazily from the event loop clock.
+
+    Consumers may go into debt; the returned delay is the time needed
+    for the bucket to refill back to zero.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Refill rate in bytes per second (0 = unlimited)
+            capacity: Maximum number of stored tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._last = asyncio.get_event_loop().time()
+
+    def take(self, amount: int) -> float:
+        """
+        Debit the bucket.
+
+        Args:
+            amount: Number of bytes to charge
+
+        Returns:
+            Seconds the caller should wait before sending more
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        now = asyncio.get_event_loop().time()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def try_take(self, amount: int) -> bool:
+        """
+        Debit the bucket only if it has enough tokens (no debt).
+
+        Args:
+            amount: Number of bytes to charge
+
+        Returns:
+            True if the tokens were taken
+        """
+        if self.rate <= 0:
+            return True
+
+        now = asyncio.get_event_loop().time()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class ShapedSession:
+    """A single HTTP response being shaped by a BandwidthShaper."""
+
+    def __init__(
+        self,
+        shaper: "BandwidthShaper",
+        priority: str,
+        buckets: List[TokenBucket],
+        keys: List[tuple],
+        yield_buckets: Optional[List[TokenBucket]] = None,
+    ):
+        self.shaper = shaper
+        self.priority = priority
+        self._buckets = buckets
+        self._yield_buckets = yield_buckets or []  # Only charged while playback is active
+        self._keys = keys
+        self._closed = False
+
+    async def throttle(self, amount: int):
+        """
+        Charge a written chunk and sleep if any limit is exceeded.
+
+        Args:
+            amount: Number of bytes just written
+        """
+        buckets = self._buckets
+        if self._yield_buckets and self.shaper.stats[PLAYBACK]["active"] > 0:
+            buckets = buckets + self._yield_buckets
+        delay = max((bucket.take(amount) for bucket in buckets), default=0.0)
+
+        stats = self.shaper.stats[self.priority]
+        stats["bytes"] += amount
+        if delay > 0:
+            stats["throttled_seconds"] += delay
+            await asyncio.sleep(delay)
+
+    def close(self):
+        """Release the shared buckets held by this session."""
+        if self._closed:
+            return
+        self._closed = True
+        self.shaper._release(self.priority, self._keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BandwidthShaper:
+    """
+    Hands out ShapedSessions and keeps the shared per-IP/per-file buckets.
+
+    Shared buckets are reference counted and dropped once the last
+    session using them finishes, so idle clients cost no memory.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[tuple, TokenBucket] = {}
+        self._refs: Dict[tuple, int] = {}
+        self.stats: Dict[str, dict] = {
+            priority: {"active": 0, "sessions": 0, "bytes": 0, "throttled_seconds": 0.0}
+            for priority in (PLAYBACK, DOWNLOAD)
+        }
+
+    def _acquire(self, key: tuple, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        return bucket
+
+    def _release(self, priority: str, keys: List[tuple]):
+        self.stats[priority]["active"] -= 1
+        for key in keys:
+            self._refs[key] -= 1
+            if self._refs[key] <= 0:
+                del self._refs[key]
+                del self._buckets[key]
+        if priority == PLAYBACK:
+            self._update_download_pool()
+
+    def _download_pool_rate(self) -> float:
+        """Pool rate for all downloads, shrinking as more viewers are active."""
+        viewers = max(1, self.stats[PLAYBACK]["active"])
+        return max(
+            config.SHAPING_DOWNLOAD_POOL_MIN_RATE,
+            config.SHAPING_DOWNLOAD_POOL_RATE / viewers,
+        )
+
+    def _update_download_pool(self):
+        pool = self._buckets.get(("class", DOWNLOAD))
+        if pool is not None:
+            pool.rate = self._download_pool_rate()
+
+    def session(
+        self,
+        client_ip: str,
+        message_id: int,
+        priority: str = PLAYBACK,
+        bitrate: Optional[float] = None,
+    ) -> ShapedSession:
+        """
+        Create a shaped session for one response.
+
+        Args:
+            client_ip: The viewer's IP address
+            message_id: The file being served
+            priority: PLAYBACK or DOWNLOAD
+            bitrate: Average bitrate of the file in bytes/s, if known
+
+        Returns:
+            A ShapedSession; call close() (or use it as a context manager) when done
+        """
+        stats = self.stats[priority]
+        stats["active"] += 1
+        stats["sessions"] += 1
+        if priority == PLAYBACK:
+            self._update_download_pool()
+
+        if not config.SHAPING_ENABLED:
+            return ShapedSession(self, priority, [], [])
+
+        burst = config.CHUNK_SIZE * 2
+        keys = [("ip", client_ip), ("file", message_id)]
+        buckets = [
+            self._acquire(keys[0], config.SHAPING_MAX_RATE_PER_IP, burst),
+            self._acquire(keys[1], config.SHAPING_MAX_RATE_PER_FILE, burst),
+        ]
+
+        yield_buckets = []
+        if priority == DOWNLOAD:
+            # কেউ ভিডিও দেখলে সব ডাউনলোড একটা pool শেয়ার করে, যেটা দর্শক বাড়লে ছোট হয়
+            keys.append(("class", DOWNLOAD))
+            yield_buckets.append(self._acquire(keys[-1], self._download_pool_rate(), burst))
+            yield_buckets.append(TokenBucket(config.SHAPING_DOWNLOAD_RATE, config.CHUNK_SIZE))
+        elif bitrate:
+            # বিটরেটের কয়েক গুণ গতিতে pacing, শুরুতে বড় burst যাতে প্লেব্যাক দ্রুত শুরু হয়
+            rate = max(config.SHAPING_MIN_PLAYBACK_RATE, bitrate * config.SHAPING_PACE_FACTOR)
+            buckets.append(TokenBucket(rate, config.SHAPING_INITIAL_BURST))
+
+        return ShapedSession(self, priority, buckets, keys, yield_buckets)
+
+    def get_stats(self) -> dict:
+        """Return a snapshot of shaping metrics."""
+        return {
+            "enabled": config.SHAPING_ENABLED,
+            "tracked_buckets": len(self._buckets),
+            "download_pool_rate": int(self._download_pool_rate()),
+            "classes": {
+                priority: dict(stats, throttled_seconds=round(stats["throttled_seconds"], 3))
+                for priority, stats in self.stats.items()
+            },
+        }
@@ -8,23 +8,37 @@ to HTTP clients without saving to disk.
 import asyncio
 import logging
 import math
-from typing import AsyncGenerator, Dict, Optional, Tuple, Union
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, List, Optional, Tuple, Union
 
 from pyrogram import Client
-from pyrogram.errors import FloodWait
+from pyrogram.errors import (
+    AuthBytesInvalid,
+    FileReferenceEmpty,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    FloodWait,
+)
 from pyrogram.file_id import FileId, FileType
+from pyrogram.raw.functions.auth import ExportAuthorization, ImportAuthorization
 from pyrogram.raw.functions.upload import GetFile
 from pyrogram.raw.types import (
     InputDocumentFileLocation,
     InputPhotoFileLocation,
     InputPeerPhotoFileLocation,
 )
+from pyrogram.session import Auth, Session
 from pyrogram.types import Message
 
 import config
+from utils.ranges import parse_ranges
 
 logger = logging.getLogger(__name__)
 
+# Errors that mean the file_reference inside a file_id has to be refreshed
+FILE_REFERENCE_ERRORS = (FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid)
+
 
 class FileNotFoundError(Exception):
     """Raised when a file is not found."""
@@ -36,6 +50,11 @@ class StreamerError(Exception):
     pass
 
 
+class FileReferenceError(StreamerError):
+    """Raised when the file_reference inside a file_id has gone stale."""
+    pass
+
+
 class ByteStreamer:
     """
     Handles streaming of Telegram files to HTTP clients.
@@ -44,6 +63,7 @@ class ByteStreamer:
     - Get file properties from messages
     - Stream file chunks from Telegram servers
     - Handle range requests for seeking
+    - Keep recently fetched chunks in a bounded LRU cache
     """
     
     def __init__(self, client: Client):
@@ -55,13 +75,23 @@ class ByteStreamer:
         """
         self.client = client
         self._cache: Dict[int, dict] = {}  # Cache for file properties
+        self._lookups: Dict[int, asyncio.Task] = {}  # In-flight log-channel lookups
+        
+        # LRU chunk cache keyed by (media_id, aligned offset)
+        self._chunks: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+        self._chunk_bytes = 0
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}  # Chunks being fetched
+        self.live_requests = 0  # GetFile calls currently serving viewers
+        self.chunk_hits = 0
+        self.chunk_misses = 0
     
-    async def get_message(self, message_id: int) -> Message:
+    async def get_message(self, message_id: int, speculative: bool = False) -> Message:
         """
         Get a message from the log channel by ID.
         
         Args:
             message_id: The message ID to fetch
+            speculative: Guess made by the prefetcher; a miss is logged at debug level
             
         Returns:
             The message object
@@ -81,7 +111,8 @@ class ByteStreamer:
             return message
             
         except Exception as e:
-            logger.error(f"Error fetching message {message_id}: {e}")
+            log = logger.debug if speculative else logger.error
+            log(f"Error fetching message {message_id}: {e}")
             raise FileNotFoundError(f"Could not fetch message: {e}")
     
     def get_media_from_message(self, message: Message) -> Optional[object]:
@@ -110,12 +141,13 @@ class ByteStreamer:
             return message.photo[-1]  # Highest resolution
         return None
     
-    async def get_file_properties(self, message_id: int) -> dict:
+    async def get_file_properties(self, message_id: int, speculative: bool = False) -> dict:
         """
         Get file properties for a message ID.
         
         Args:
             message_id: The message ID in the log channel
+            speculative: Lookup made by the prefetcher (quieter logging)
             
         Returns:
             Dictionary with file properties
@@ -124,8 +156,33 @@ class ByteStreamer:
         if message_id in self._cache:
             return self._cache[message_id]
         
+        return await self._lookup(message_id, speculative)
+    
+    async def _lookup(self, message_id: int, speculative: bool = False) -> dict:
+        """
+        Fetch properties from the log channel, single-flight per message.
+        
+        Cache misses and file_reference refreshes for the same message all
+        await one shared task.
+        """
+        task = self._lookups.get(message_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_properties(message_id, speculative))
+            self._lookups[message_id] = task
+            
+            def _done(t):
+                self._lookups.pop(message_id, None)
+                if not t.cancelled():
+                    t.exception()  # Mark as retrieved even if every waiter left
+            
+            task.add_done_callback(_done)
+        
+        # shield: a disconnecting viewer must not cancel the lookup for everyone else
+        return await asyncio.shield(task)
+    
+    async def _fetch_properties(self, message_id: int, speculative: bool = False) -> dict:
         # Fetch message
-        message = await self.get_message(message_id)
+        message = await self.get_message(message_id, speculative)
         media = self.get_media_from_message(message)
         
         if not media:
@@ -137,6 +194,7 @@ class ByteStreamer:
             "file_size": getattr(media, "file_size", 0),
             "file_name": getattr(media, "file_name", "file"),
             "mime_type": getattr(media, "mime_type", "application/octet-stream"),
+            "duration": getattr(media, "duration", None),
         }
         
         # Cache the properties
@@ -144,46 +202,82 @@ class ByteStreamer:
         
         return properties
     
-    def parse_range_header(
-        self, 
-        range_header: str, 
+    def get_cached_properties(self, message_id: int) -> Optional[dict]:
+        """
+        Get file properties only if they are already cached (no lookup).
+        
+        Args:
+            message_id: The message ID in the log channel
+            
+        Returns:
+            The cached properties or None
+        """
+        return self._cache.get(message_id)
+    
+    def cache_properties(self, message_id: int, properties: dict):
+        """
+        Seed the properties cache (e.g. right after forwarding a file),
+        so the first stream request does not need a lookup.
+        
+        Args:
+            message_id: The message ID in the log channel
+            properties: Dictionary in the same shape as get_file_properties()
+        """
+        self._cache[message_id] = {
+            "file_id": properties["file_id"],
+            "file_unique_id": properties["file_unique_id"],
+            "file_size": properties.get("file_size", 0),
+            "file_name": properties.get("file_name", "file"),
+            "mime_type": properties.get("mime_type", "application/octet-stream"),
+            "duration": properties.get("duration"),
+        }
+    
+    async def refresh_file_id(self, message_id: int, stale_file_id: str) -> str:
+        """
+        Refetch a message to get a fresh file_reference.
+        
+        Concurrent callers for the same message share a single refetch, and
+        callers whose file_id was already replaced by another stream just
+        pick up the new one from the cache.
+        
+        Args:
+            message_id: The message ID in the log channel
+            stale_file_id: The file_id that just failed
+            
+        Returns:
+            A file_id with a valid file_reference
+        """
+        cached = self._cache.get(message_id)
+        if cached and cached["file_id"] != stale_file_id:
+            return cached["file_id"]
+        
+        # ক্যাশ মুছে ফেলা হয় না: রিফ্রেশ চলাকালীন নতুন স্ট্রিমও একই lookup এ যোগ দেয়
+        properties = await self._lookup(message_id)
+        logger.info(f"Refreshed file reference for message {message_id}")
+        return properties["file_id"]
+    
+    def parse_ranges(
+        self,
+        range_header: Optional[str],
         file_size: int
-    ) -> Tuple[int, int]:
+    ) -> Optional[List[Tuple[int, int]]]:
         """
-        Parse HTTP Range header.
+        Parse an HTTP Range header that may contain several ranges.
+        
+        See utils.ranges.parse_ranges.
         
         Args:
             range_header: The Range header value
             file_size: Total file size
             
         Returns:
-            Tuple of (start, end) byte positions
-        """
-        if not range_header or not range_header.startswith("bytes="):
-            return 0, file_size - 1
-        
-        range_str = range_header[6:]  # Remove "bytes="
-        
-        if range_str.startswith("-"):
-            # Suffix range: last N bytes
-            suffix_length = int(range_str[1:])
-            start = max(0, file_size - suffix_length)
-            end = file_size - 1
-        elif range_str.endswith("-"):
-            # Range from start to end
-            start = int(range_str[:-1])
-            end = file_size - 1
-        else:
-            # Explicit range
-            parts = range_str.split("-")
-            start = int(parts[0])
-            end = int(parts[1]) if parts[1] else file_size - 1
-        
-        # Validate range
-        start = max(0, min(start, file_size - 1))
-        end = max(start, min(end, file_size - 1))
-        
-        return start, end
+            Sorted, merged list of inclusive (start, end) byte positions,
+            or None if the whole file should be served
+            
+        Raises:
+            ValueError: If the header is valid but no range is satisfiable
+        """
+        return parse_ranges(range_header, file_size)
     
     def get_file_location(self, file_id_str: str):
         """
@@ -224,28 +318,298 @@ class ByteStreamer:
         else:
             raise StreamerError(f"Unsupported file type: {file_type}")
     
+    async def get_media_session(self, dc_id: int) -> Session:
+        """
+        Get the media session for the data centre a file is stored on.
+        
+        GetFile sent to any other DC fails with FILE_MIGRATE_X, so every DC
+        gets its own session, created the way pyrogram's Client.get_file
+        does it. Sessions live in client.media_sessions, so client.stop()
+        closes them.
+        
+        Args:
+            dc_id: The file's DC (FileId.dc_id)
+            
+        Returns:
+            A started Session authorized on that DC
+        """
+        session = self.client.media_sessions.get(dc_id)
+        if session is not None:
+            return session
+        
+        async with self.client.media_sessions_lock:
+            session = self.client.media_sessions.get(dc_id)
+            if session is not None:
+                return session
+            
+            storage = self.client.storage
+            test_mode = await storage.test_mode()
+            
+            if dc_id == await storage.dc_id():
+                session = Session(
+                    self.client, dc_id, await storage.auth_key(), test_mode, is_media=True
+                )
+                await session.start()
+            else:
+                session = Session(
+                    self.client, dc_id,
+                    await Auth(self.client, dc_id, test_mode).create(),
+                    test_mode, is_media=True
+                )
+                await session.start()
+                
+                # হোম DC থেকে authorization export করে ফাইলের DC তে import
+                for _ in range(3):
+                    exported_auth = await self.client.invoke(ExportAuthorization(dc_id=dc_id))
+                    try:
+                        await session.invoke(
+                            ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes)
+                        )
+                    except AuthBytesInvalid:
+                        continue
+                    break
+                else:
+                    await session.stop()
+                    raise AuthBytesInvalid
+            
+            self.client.media_sessions[dc_id] = session
+            logger.info(f"Created media session for DC {dc_id}")
+            return session
+    
+    def _store_chunk(self, key: Tuple[int, int], chunk: bytes):
+        """Add a chunk to the LRU cache, evicting the oldest ones if needed."""
+        if key in self._chunks or len(chunk) > config.CHUNK_CACHE_SIZE:
+            return
+        self._chunks[key] = chunk
+        self._chunk_bytes += len(chunk)
+        while self._chunk_bytes > config.CHUNK_CACHE_SIZE:
+            _, evicted = self._chunks.popitem(last=False)
+            self._chunk_bytes -= len(evicted)
+    
+    def has_chunk(self, file_id: str, offset: int) -> bool:
+        """Check if the chunk containing offset is cached or being fetched."""
+        key = (FileId.decode(file_id).media_id, offset - offset % config.CHUNK_SIZE)
+        return key in self._chunks or key in self._inflight
+    
+    async def _get_file(
+        self,
+        dc_id: int,
+        file_location,
+        key: Tuple[int, int],
+        live: bool,
+    ) -> bytes:
+        if live:
+            self.live_requests += 1
+        try:
+            session = await self.get_media_session(dc_id)
+            result = await session.invoke(
+                GetFile(
+                    location=file_location,
+                    offset=key[1],
+                    limit=config.CHUNK_SIZE
+                ),
+                sleep_threshold=30
+            )
+        finally:
+            if live:
+                self.live_requests -= 1
+        
+        chunk = bytes(result.bytes)
+        if chunk:
+            self._store_chunk(key, chunk)
+        return chunk
+    
+    async def fetch_chunk(
+        self,
+        dc_id: int,
+        file_location,
+        media_id: int,
+        offset: int,
+        live: bool = True,
+    ) -> bytes:
+        """
+        Get one aligned chunk, from the cache if possible.
+        
+        Concurrent requests for the same chunk (live or prefetch) share
+        a single GetFile call.
+        
+        Args:
+            dc_id: The DC the file is stored on
+            file_location: InputFileLocation for the file
+            media_id: The file's media id (cache key)
+            offset: Chunk-aligned byte offset
+            live: Whether a viewer is waiting on this chunk
+            
+        Returns:
+            The chunk bytes (empty at end of file)
+        """
+        key = (media_id, offset)
+        
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            self.chunk_hits += 1
+            return chunk
+        
+        future = self._inflight.get(key)
+        if future is None:
+            self.chunk_misses += 1
+            future = asyncio.ensure_future(self._get_file(dc_id, file_location, key, live))
+            self._inflight[key] = future
+            
+            def _done(f):
+                self._inflight.pop(key, None)
+                if not f.cancelled():
+                    f.exception()  # Mark as retrieved even if every waiter left
+            
+            future.add_done_callback(_done)
+        
+        # shield: one waiter disconnecting must not cancel the fetch for the others
+        return await asyncio.shield(future)
+    
+    async def prefetch(
+        self,
+        message_id: int,
+        offset: int,
+        file_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Warm the chunk at offset into the cache. Never raises.
+        
+        Args:
+            message_id: The message ID in the log channel
+            offset: Any byte offset inside the wanted chunk
+            file_id: The file_id if already known (skips the properties lookup)
+            
+        Returns:
+            True if the chunk is now cached
+        """
+        try:
+            if file_id is None:
+                properties = await self.get_file_properties(message_id, speculative=True)
+                file_id = properties["file_id"]
+            decoded = FileId.decode(file_id)
+            await self.fetch_chunk(
+                decoded.dc_id,
+                self.get_file_location(file_id),
+                decoded.media_id,
+                offset - offset % config.CHUNK_SIZE,
+                live=False,
+            )
+            return True
+        except Exception as e:
+            logger.debug(f"Prefetch of message {message_id} at {offset} skipped: {e}")
+            return False
+    
+    async def _read_chunk(self, source: dict, offset: int) -> bytes:
+        """
+        Read one aligned chunk, handling FloodWait and stale references.
+        
+        Args:
+            source: Mutable dict with file_id, dc_id, location, media_id,
+                message_id and status; updated in place when the reference is refreshed
+            offset: Chunk-aligned byte offset
+            
+        Returns:
+            The chunk bytes (empty at end of file)
+        """
+        refreshed = False  # Only one refresh per failing chunk
+        status = source["status"]
+        
+        while True:
+            try:
+                # Request chunk from the cache or Telegram
+                if status is not None:
+                    status.update(await_point="telegram", await_offset=offset)
+                chunk = await self.fetch_chunk(
+                    source["dc_id"], source["location"], source["media_id"], offset
+                )
+                if status is not None:
+                    status["await_point"] = None
+                return chunk
+            except FloodWait as e:
+                logger.warning(f"FloodWait: sleeping for {e.value} seconds")
+                if status is not None:
+                    status.update(await_point="flood_wait", flood_wait_until=time.time() + e.value)
+                await asyncio.sleep(e.value)
+            except FILE_REFERENCE_ERRORS as e:
+                logger.warning(f"File reference expired at offset {offset}: {e}")
+                if source["message_id"] is None or refreshed:
+                    raise FileReferenceError(f"File reference expired: {e}")
+                
+                if status is not None:
+                    status["await_point"] = "refreshing"
+                try:
+                    file_id = await self.refresh_file_id(
+                        source["message_id"], source["file_id"]
+                    )
+                except FileNotFoundError as e:
+                    raise FileReferenceError(f"Could not refresh file reference: {e}")
+
+                # মেসেজ এডিট/বদলে গেলে অন্য ফাইলের বাইট একই রেসপন্সে পাঠানো যাবে না
+                decoded = FileId.decode(file_id)
+                if decoded.media_id != source["media_id"]:
+                    raise FileReferenceError(
+                        f"Message {source['message_id']} now holds a different file"
+                    )
+                source["file_id"] = file_id
+                source["location"] = self.get_file_location(file_id)
+                source["dc_id"] = decoded.dc_id
+                refreshed = True
+            except Exception as e:
+                logger.error(f"Error streaming chunk at offset {offset}: {e}")
+                raise StreamerError(f"Streaming error: {e}")
+    
+    def _make_source(
+        self,
+        file_id: str,
+        message_id: Optional[int],
+        status: Optional[dict] = None,
+    ) -> dict:
+        decoded = FileId.decode(file_id)
+        return {
+            "file_id": file_id,
+            "dc_id": decoded.dc_id,
+            "location": self.get_file_location(file_id),
+            "media_id": decoded.media_id,
+            "message_id": message_id,
+            "status": status,
+        }
+    
     async def yield_file(
         self,
         file_id: str,
         offset: int = 0,
         limit: int = 0,
+        message_id: Optional[int] = None,
+        status: Optional[dict] = None,
     ) -> AsyncGenerator[bytes, None]:
         """
         Stream file chunks from Telegram.
         
+        If message_id is given, an expired file_reference is refreshed from
+        the log channel and streaming resumes at the current offset.
+        
         Args:
             file_id: The Telegram file_id
             offset: Starting byte position
             limit: Maximum bytes to stream (0 = until end)
+            message_id: Log channel message the file belongs to
+            status: Optional dict that receives the current await point
+                ("telegram", "flood_wait", "refreshing") for /debug/tasks
             
         Yields:
             File chunks as bytes
         """
-        file_location = self.get_file_location(file_id)
+        source = self._make_source(file_id, message_id, status)
         
-        current_offset = offset
         chunk_size = config.CHUNK_SIZE
         
+        # GetFile needs chunk-aligned offsets, so start at the chunk
+        # boundary and drop the leading bytes of the first chunk
+        current_offset = offset - (offset % chunk_size)
+        skip = offset - current_offset
+        
         # Calculate end position
         if limit > 0:
             end_offset = offset + limit
@@ -253,44 +617,86 @@ class ByteStreamer:
             end_offset = float('inf')  # Will stop when server returns empty
         
         while current_offset < end_offset:
-            try:
-                # Request chunk from Telegram
-                result = await self.client.invoke(
-                    GetFile(
-                        location=file_location,
-                        offset=current_offset,
-                        limit=chunk_size
-                    ),
-                    sleep_threshold=30
-                )
-                
-                if not result.bytes:
-                    # No more data
-                    break
-                
-                chunk = bytes(result.bytes)
-                
-                # If limit is set, only yield up to the limit
-                if limit > 0:
-                    remaining = end_offset - current_offset
-                    if len(chunk) > remaining:
-                        chunk = chunk[:remaining]
-                
+            chunk = await self._read_chunk(source, current_offset)
+            
+            if not chunk:
+                # No more data
+                break
+            
+            fetched = len(chunk)
+            
+            if skip:
+                chunk = chunk[skip:]
+            
+            # If limit is set, only yield up to the limit
+            if limit > 0:
+                remaining = end_offset - (current_offset + skip)
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+            
+            if chunk:
                 yield chunk
+            
+            current_offset += fetched
+            skip = 0
+            
+            # If we got less than requested, we've reached the end
+            if fetched < chunk_size:
+                break
+    
+    async def yield_ranges(
+        self,
+        file_id: str,
+        ranges: List[Tuple[int, int]],
+        message_id: Optional[int] = None,
+        status: Optional[dict] = None,
+    ) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """
+        Stream several byte ranges, fetching every aligned chunk only once.
+        
+        Ranges must be sorted and non-overlapping (see parse_ranges), so a
+        chunk shared by two neighbouring ranges is still in hand when the
+        second range needs it.
+        
+        Args:
+            file_id: The Telegram file_id
+            ranges: Sorted, merged list of inclusive (start, end) pairs
+            message_id: Log channel message the file belongs to
+            status: Optional dict that receives the current await point
+            
+        Yields:
+            Tuples of (range index, bytes)
+        """
+        source = self._make_source(file_id, message_id, status)
+        chunk_size = config.CHUNK_SIZE
+        last_offset, last_chunk = None, b""
+        
+        for index, (start, end) in enumerate(ranges):
+            position = start
+            while position <= end:
+                aligned = position - position % chunk_size
+                if aligned != last_offset:
+                    last_chunk = await self._read_chunk(source, aligned)
+                    last_offset = aligned
+                    if not last_chunk:
+                        raise StreamerError(f"Unexpected end of file at offset {aligned}")
                 
-                current_offset += len(chunk)
-                
-                # If we got less than requested, we've reached the end
-                if len(result.bytes) < chunk_size:
-                    break
-                    
-            except FloodWait as e:
-                logger.warning(f"FloodWait: sleeping for {e.value} seconds")
-                await asyncio.sleep(e.value)
-                continue
-            except Exception as e:
-                logger.error(f"Error streaming chunk at offset {current_offset}: {e}")
-                raise StreamerError(f"Streaming error: {e}")
+                piece = last_chunk[position - aligned:end - aligned + 1]
+                if not piece:
+                    raise StreamerError(f"Unexpected end of file at offset {position}")
+                yield index, piece
+                position += len(piece)
+    
+    def get_stats(self) -> dict:
+        """Return cache and request counters."""
+        return {
+            "cached_files": len(self._cache),
+            "cached_chunks": len(self._chunks),
+            "cached_bytes": self._chunk_bytes,
+            "chunk_hits": self.chunk_hits,
+            "chunk_misses": self.chunk_misses,
+            "live_requests": self.live_requests,
+        }
     
     def clear_cache(self, message_id: Optional[int] = None):
         """
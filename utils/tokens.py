@@ -0,0 +1,157 @@
+"""
+Signed stream tokens.
+
+A token carries everything the web server needs to answer a request
+(message id, size, duration, mime type, file_unique_id, file_id, file
+name and an expiry), signed with HMAC-SHA256 so it can be verified with pure CPU and
+cannot be forged or enumerated like plain message ids. Because the
+file_id is inside, streaming can start without a log-channel lookup even
+right after a restart.
+"""
+
+import base64
+import hashlib
+import hmac
+import struct
+import time
+from typing import Optional
+
+import config
+
+# Token layout: version, message_id, file_size, expires (0 = never), duration
+# followed by length-prefixed mime_type, file_unique_id, file_id and file_name
+_HEADER = struct.Struct(">BIQII")
+_VERSION = 1
+_SIGNATURE_SIZE = 16
+
+
+class InvalidTokenError(Exception):
+    """Raised when a token is malformed, forged or expired."""
+    pass
+
+
+def _get_secret() -> bytes:
+    """Return the signing key, derived from BOT_TOKEN if not configured."""
+    if config.STREAM_SECRET:
+        return config.STREAM_SECRET.encode()
+    return hashlib.sha256(f"stream-token:{config.BOT_TOKEN}".encode()).digest()
+
+
+_SECRET = _get_secret()
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_SECRET, payload, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def _pack_str(value: str) -> bytes:
+    # ২৫৫ বাইটে কাটলেও UTF-8 অক্ষর মাঝখান থেকে ভাঙা যাবে না
+    data = value.encode()[:255].decode(errors="ignore").encode()
+    return bytes([len(data)]) + data
+
+
+def _unpack_str(payload: bytes, pos: int):
+    if pos >= len(payload):
+        raise InvalidTokenError("Truncated token")
+    length = payload[pos]
+    end = pos + 1 + length
+    if end > len(payload):
+        raise InvalidTokenError("Truncated token")
+    return payload[pos + 1:end].decode(), end
+
+
+def encode_stream_token(
+    message_id: int,
+    file_size: int,
+    mime_type: str,
+    file_unique_id: str,
+    file_id: str,
+    file_name: Optional[str] = None,
+    duration: Optional[int] = None,
+    ttl: Optional[int] = None,
+) -> str:
+    """
+    Create a signed, URL-safe token for a file.
+
+    Args:
+        message_id: The message ID in the log channel
+        file_size: Total file size in bytes
+        mime_type: The file's MIME type
+        file_unique_id: Telegram's stable unique id for the file
+        file_id: The file_id to stream from (refreshed on FILE_REFERENCE_* errors)
+        file_name: Name sent in Content-Disposition (cut to 255 bytes)
+        duration: Media duration in seconds, if known (used for pacing)
+        ttl: Lifetime in seconds (defaults to config.STREAM_LINK_TTL, 0 = never)
+
+    Returns:
+        The token string
+
+    Raises:
+        ValueError: If file_id does not fit in the token
+    """
+    if not file_id or len(file_id.encode()) > 255:
+        raise ValueError("file_id must be 1-255 bytes")
+
+    if ttl is None:
+        ttl = config.STREAM_LINK_TTL
+    expires = int(time.time()) + ttl if ttl > 0 else 0
+
+    payload = (
+        _HEADER.pack(_VERSION, message_id, file_size or 0, expires, duration or 0)
+        + _pack_str(mime_type or "application/octet-stream")
+        + _pack_str(file_unique_id or "")
+        + _pack_str(file_id)
+        + _pack_str(file_name or "")
+    )
+    raw = payload + _sign(payload)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_stream_token(token: str) -> dict:
+    """
+    Verify a token and return its contents.
+
+    Args:
+        token: The token string from the URL
+
+    Returns:
+        Dictionary with message_id, file_size, duration, mime_type,
+        file_unique_id, file_id, file_name and expires
+
+    Raises:
+        InvalidTokenError: If the token is malformed, forged or expired
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise InvalidTokenError("Malformed token")
+
+    if len(raw) < _HEADER.size + 4 + _SIGNATURE_SIZE:
+        raise InvalidTokenError("Malformed token")
+
+    payload, signature = raw[:-_SIGNATURE_SIZE], raw[-_SIGNATURE_SIZE:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidTokenError("Bad signature")
+
+    version, message_id, file_size, expires, duration = _HEADER.unpack_from(payload)
+    if version != _VERSION:
+        raise InvalidTokenError(f"Unsupported token version {version}")
+
+    if expires and expires < time.time():
+        raise InvalidTokenError("Link expired")
+
+    mime_type, pos = _unpack_str(payload, _HEADER.size)
+    file_unique_id, pos = _unpack_str(payload, pos)
+    file_id, pos = _unpack_str(payload, pos)
+    file_name, _ = _unpack_str(payload, pos)
+
+    return {
+        "message_id": message_id,
+        "file_size": file_size,
+        "duration": duration or None,
+        "mime_type": mime_type,
+        "file_unique_id": file_unique_id,
+        "file_id": file_id,
+        "file_name": file_name,
+        "expires": expires,
+    }